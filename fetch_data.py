@@ -4,8 +4,10 @@ import json
 import time
 import requests
 import urllib.parse
-from datetime import datetime
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 
 # Local Configuration
 try:
@@ -14,86 +16,207 @@ except ImportError:
     print("CRITICAL ERROR: config.py not found.")
     sys.exit(1)
 
+# Optional fast JSON parser (falls back to stdlib json, which also accepts bytes)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# ==========================================
+# HTTP SESSION
+# ==========================================
+# Single keep-alive session: reuses the TCP/TLS connection across every call
+# and transparently retries transient (5xx) responses. Throttling (429) is
+# handled once, in fetch_api, so the two retry layers never stack.
+SESSION = requests.Session()
+SESSION.headers.update({
+    "Authorization": f"Bearer {config.API_KEY}",
+    "Accept": "application/json"
+})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Retry-After is ignored here (urllib3 would sleep on a 503 for as long as
+    # the server says); exponential backoff still applies
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+))
+
+# Attempts for a throttled (429) request, honouring Retry-After up to a cap
+RATE_LIMIT_RETRIES: int = 3
+MAX_RETRY_AFTER_SECONDS: int = 10
+
 # ==========================================
 # HELPERS
 # ==========================================
 def log(msg: str, level: str = "INFO") -> None:
     """Logs a message with timestamp and level."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
+    timestamp = time.strftime("%H:%M:%S", time.localtime())
     print(f"[{timestamp}] [{level}] {msg}")
 
+_DATA_DIR_READY = False
+
 def ensure_data_dir() -> None:
-    """Ensures data directory exists."""
-    if not os.path.exists(config.DATA_DIR):
-        os.makedirs(config.DATA_DIR, exist_ok=True)
+    """Ensures data directory exists (checked once per process)."""
+    global _DATA_DIR_READY
+    if _DATA_DIR_READY:
+        return
+    try:
+        os.makedirs(config.DATA_DIR)
         log(f"Created data directory: {os.path.abspath(config.DATA_DIR)}")
+    except FileExistsError:
+        pass
+    _DATA_DIR_READY = True
+
+def load_json(filename: str) -> Optional[Any]:
+    """Loads a previously saved JSON file (None if missing or unreadable)."""
+    path = os.path.join(config.DATA_DIR, filename)
+    if not os.path.exists(path):
+        return None
+        
+    try:
+        with open(path, 'rb') as f:
+            return _json_loads(f.read())
+    except Exception as e:
+        log(f"Error loading {filename}: {e}", "ERROR")
+    
+    return None
 
 def save_json(data: Any, filename: str) -> None:
-    """Saves data to a JSON file."""
+    """Saves data to a compact JSON file (consumers only json.load it).
+
+    The write is skipped when the file on disk already holds identical bytes.
+    """
     path = os.path.join(config.DATA_DIR, filename)
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        blob = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        
+        # Cheap size check first; only read the file back when sizes match
+        if os.path.exists(path) and os.path.getsize(path) == len(blob):
+            with open(path, 'rb') as f:
+                if f.read() == blob:
+                    log(f"Unchanged, skipped write: {filename}")
+                    return
+        
+        # Write to a temp file and atomically swap it in, so an interrupted
+        # run never leaves a truncated JSON behind (no fsync: losing the
+        # last write on power failure is acceptable for the dashboard)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
         log(f"Saved: {filename}")
     except Exception as e:
         log(f"Failed to save {filename}: {e}", "ERROR")
 
 def fetch_api(endpoint: str, params: Optional[Dict] = None) -> Optional[Any]:
-    """Generic API fetcher with strict error handling."""
+    """Generic API fetcher with strict error handling (backs off on 429 via Retry-After)."""
     url = f"{config.API_BASE_URL}{endpoint}"
-    headers = {
-        "Authorization": f"Bearer {config.API_KEY}",
-        "Accept": "application/json"
-    }
     
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            log(f"Resource not found: {endpoint}", "ERROR")
-        elif e.response.status_code == 403:
-            log(f"Access denied (Check API Key/IP): {endpoint}", "ERROR")
-        else:
-            log(f"HTTP Error {e.response.status_code}: {endpoint}", "ERROR")
-    except Exception as e:
-        log(f"Network/Unexpected Error: {url} -> {e}", "ERROR")
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            response = SESSION.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code
+            if status == 429 and attempt < RATE_LIMIT_RETRIES:
+                retry_after = e.response.headers.get("Retry-After", "1")
+                wait = min(int(retry_after) if retry_after.isdigit() else 1, MAX_RETRY_AFTER_SECONDS)
+                log(f"Rate limited, retrying in {wait}s: {endpoint}", "WARNING")
+                time.sleep(wait)
+                continue
+            if status == 404:
+                log(f"Resource not found: {endpoint}", "ERROR")
+            elif status == 403:
+                log(f"Access denied (Check API Key/IP): {endpoint}", "ERROR")
+            else:
+                log(f"HTTP Error {status}: {endpoint}", "ERROR")
+        except Exception as e:
+            log(f"Network/Unexpected Error: {url} -> {e}", "ERROR")
+        break
     
     return None
 
-def fetch_deep_war_log(encoded_tag: str) -> list:
-    """Fetches all available war log history using pagination."""
+def war_key(war: Dict) -> Tuple:
+    """Identity of a river race entry in the war log."""
+    return (war.get("seasonId"), war.get("sectionIndex"), war.get("createdDate"))
+
+def fetch_deep_war_log(encoded_tag: str, first_page: Optional[Dict] = None, saved_items: Optional[List[Dict]] = None) -> Tuple[List[Dict], int]:
+    """Fetches all available war log history using pagination.
+
+    If `first_page` is given (already fetched by the caller), it seeds the
+    loop and page 1 is not requested again. If `saved_items` (the war log
+    from a previous run) is given, pagination stops at the first page that
+    reaches an already-saved war and the new wars are prepended to it
+    (capped at `max_pages * 10` entries). If a page fails before the saved
+    history is reached, the saved history is returned unchanged so no gap
+    is written; the next run fetches the new wars again.
+    
+    Returns the war log to save and the number of newly fetched wars.
+    """
+    saved_items = saved_items or []
+    seen = {war_key(w) for w in saved_items}
     all_logs = []
+    extend = all_logs.extend
     cursor = None
     page_count = 0
+    pages_fetched = 0
     max_pages = 20 # Safety limit to prevent infinite loops, can be increased
+    data = first_page
+    reached_saved = False # Stopped on a saved war or at the end of the log
+    failed = False
     
     log(f"Starting deep fetch for War Log...")
     
     while page_count < max_pages:
-        params = {"limit": 10} # Max limit per request is usually small
-        if cursor:
-            params["after"] = cursor
-            
-        data = fetch_api(f"/clans/{encoded_tag}/riverracelog", params=params)
+        if data is None:
+            params = {"limit": 10} # Max limit per request is usually small
+            if cursor:
+                params["after"] = cursor
+            data = fetch_api(f"/clans/{encoded_tag}/riverracelog", params=params)
         
-        if not data or "items" not in data or not data["items"]:
+        if not data:
+            failed = True
+            break
+        if not data.get("items"):
+            reached_saved = True
             break
             
         items = data["items"]
-        all_logs.extend(items)
-        log(f"Fetched page {page_count + 1}: {len(items)} items. Total so far: {len(all_logs)}")
+        new_items = [w for w in items if war_key(w) not in seen]
+        extend(new_items)
+        pages_fetched += 1
+        
+        # Log is newest-first: once a saved war shows up, the rest is on disk
+        if len(new_items) < len(items):
+            reached_saved = True
+            break
         
         # Check for pagination
         if "paging" in data and "cursors" in data["paging"] and "after" in data["paging"]["cursors"]:
             cursor = data["paging"]["cursors"]["after"]
             page_count += 1
-            time.sleep(0.5) # Respect rate limits
+            data = None
         else:
+            reached_saved = True
             break
-            
-    return all_logs
+    
+    log(f"Deep fetch: {pages_fetched} pages, {len(all_logs)} new items")
+    if failed and saved_items:
+        log("War log fetch interrupted before reaching saved history; keeping saved log.", "WARNING")
+        return saved_items, 0
+    if not reached_saved:
+        # Hit max_pages: everything saved is older than what was fetched
+        return all_logs, len(all_logs)
+    # Keep the stored log bounded to what a full deep fetch would return
+    return (all_logs + saved_items)[:max_pages * 10], len(all_logs)
 
 # ==========================================
 # MAIN EXECUTION
@@ -108,9 +231,17 @@ def main():
     ensure_data_dir()
     encoded_tag = urllib.parse.quote(config.CLAN_TAG)
     
+    # Independent endpoints are fetched concurrently over the pooled session
+    log("Fetching Clan Info, Current War and War Log (page 1)...")
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_clan = ex.submit(fetch_api, f"/clans/{encoded_tag}")
+        f_war = ex.submit(fetch_api, f"/clans/{encoded_tag}/currentriverrace")
+        f_log0 = ex.submit(fetch_api, f"/clans/{encoded_tag}/riverracelog", {"limit": 10})
+        clan = f_clan.result()
+        war = f_war.result()
+        first_log_page = f_log0.result()
+    
     # 1. Clan Info
-    log("Fetching Clan Info...")
-    clan = fetch_api(f"/clans/{encoded_tag}")
     if clan:
         save_json(clan, "clan_info.json")
     else:
@@ -118,19 +249,23 @@ def main():
         sys.exit(1)
         
     # 2. Current War
-    log("Fetching Current War...")
-    war = fetch_api(f"/clans/{encoded_tag}/currentriverrace")
     if war:
         save_json(war, "current_war.json")
         
     # 3. War Log (Deep Fetch)
     log("Fetching War Log History...")
-    war_log_items = fetch_deep_war_log(encoded_tag)
+    saved_log = load_json("war_log.json") or {}
+    saved_items = saved_log.get("items")
+    if saved_items and saved_log.get("clanTag") != config.CLAN_TAG:
+        # Saved history belongs to another clan (or predates the tag field)
+        log("Saved war log is not for this clan; fetching full history.", "WARNING")
+        saved_items = None
+    war_log_items, new_count = fetch_deep_war_log(encoded_tag, first_page=first_log_page, saved_items=saved_items)
     if war_log_items:
         # Save as a standard structure resembling the API response for compatibility
-        war_log_data = {"items": war_log_items}
+        war_log_data = {"clanTag": config.CLAN_TAG, "items": war_log_items}
         save_json(war_log_data, "war_log.json")
-        log(f"Deep fetch complete. Total wars retrieved: {len(war_log_items)}", "SUCCESS")
+        log(f"Deep fetch complete. New wars retrieved: {new_count}. Total wars saved: {len(war_log_items)}", "SUCCESS")
     
     log("=== FETCH COMPLETE ===", "SUCCESS")
 
@@ -2,10 +2,11 @@ import os
 import sys
 import json
 import time
+import functools
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Any, Optional, Tuple, Union
+from typing import Dict, List, Any, Optional, Tuple
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 
 # Local Configuration
 try:
@@ -14,12 +15,19 @@ except ImportError:
     print("CRITICAL ERROR: config.py not found.")
     sys.exit(1)
 
+# Optional fast JSON parser (falls back to stdlib json, which also accepts bytes)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # ==========================================
 # HELPERS
 # ==========================================
 def log(msg: str, level: str = "INFO") -> None:
     """Logs a message with timestamp and level."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
+    timestamp = time.strftime("%H:%M:%S", time.localtime())
     print(f"[{timestamp}] [{level}] {msg}")
 
 def load_json(filename: str) -> Optional[Dict[str, Any]]:
@@ -29,8 +37,8 @@ def load_json(filename: str) -> Optional[Dict[str, Any]]:
         return None
         
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(path, 'rb') as f:
+            data = _json_loads(f.read())
             log(f"Loaded data: {filename}")
             return data
     except Exception as e:
@@ -38,40 +46,39 @@ def load_json(filename: str) -> Optional[Dict[str, Any]]:
     
     return None
 
+def _render_one(env: Environment, tmpl_name: str, context: Dict[str, Any]) -> None:
+    """Renders a single template to a page in the project root."""
+    try:
+        template = env.get_template(tmpl_name)
+        # Render fully before touching the file so a failed render keeps the previous page
+        output = template.render(context)
+        with open(tmpl_name, "w", encoding="utf-8") as f:
+            f.write(output)
+        log(f"Generated Page: {tmpl_name}")
+    except Exception as e:
+        log(f"Render Error [{tmpl_name}]: {e}", "ERROR")
+
 # ==========================================
 # CORE LOGIC
 # ==========================================
+# Lookup tables indexed by weekday (0=Mon .. 6=Sun)
+# War Day: Thu(3)->1, Fri(4)->2, Sat(5)->3, Sun(6)->4; Mon-Wed show end of war (4)
+# Target decks: 4 per war day
+_WAR_DAY = (4, 4, 4, 1, 2, 3, 4)
+_TARGET_DECKS = (16, 16, 16, 4, 8, 12, 16)
+_DAY_NAMES = ("Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo")
+
 def get_war_day_context() -> Dict[str, Any]:
     """Calculates the current war day (Thursday=1 .. Sunday=4)."""
-    # 0=Mon, 1=Tue, 2=Wed, 3=Thu, 4=Fri, 5=Sat, 6=Sun
     weekday = datetime.now().weekday()
-    
-    # Map weekday to War Day (1-4)
-    # Thu(3)->1, Fri(4)->2, Sat(5)->3, Sun(6)->4
-    war_day = 0
-    if 3 <= weekday <= 6:
-        war_day = weekday - 2
-    else:
-        war_day = 4 # Default to end of war for Mon-Wed viewing
-        
-    day_names = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
-    
-    # Target decks: 4 per day
-    targets = {
-        3: 4,  # Thu
-        4: 8,  # Fri
-        5: 12, # Sat
-        6: 16  # Sun
-    }
-    target_decks = targets.get(weekday, 16)
-    
     return {
-        "day_name": day_names[weekday],
-        "war_day": war_day,
-        "target_decks": target_decks,
+        "day_name": _DAY_NAMES[weekday],
+        "war_day": _WAR_DAY[weekday],
+        "target_decks": _TARGET_DECKS[weekday],
         "target_decks_total": 16 # Total for the week
     }
 
+@functools.lru_cache(maxsize=None)
 def calculate_league(trophies: int) -> Tuple[str, str]:
     """Determines league name and theme color based on trophies."""
     if trophies >= 3000: return "Legendary", "Purple"
@@ -79,55 +86,78 @@ def calculate_league(trophies: int) -> Tuple[str, str]:
     if trophies >= 600: return "Silver", "Silver"
     return "Bronze", "Bronze"
 
-def process_audit(clan_members: List[Dict], war_data: Optional[Dict], audit_info: Dict) -> Tuple[List[Dict], Dict[str, int]]:
+# Status lookup tables indexed by status id (0=zero, 1=incomplete, 2=ok)
+_STATUS_CLASS = ("danger", "warning", "success")
+_STATUS_LABEL = ("ZERADO", "ATRASADO", "OK")
+
+def index_members(members: List[Dict]) -> Dict[str, List[Any]]:
+    """Builds a Structure-of-Arrays view of the member list in a single pass."""
+    roster = {"tag": [], "name": [], "role": [], "trophies": [], "donations": []}
+    tags, names, roles = roster["tag"], roster["name"], roster["role"]
+    trophies, donations = roster["trophies"], roster["donations"]
+    
+    for m in members:
+        tags.append(m.get("tag"))
+        names.append(m.get("name"))
+        roles.append(m.get("role"))
+        trophies.append(m.get("trophies", 0))
+        donations.append(m.get("donations", 0))
+        
+    return roster
+
+def index_participants(war_data: Optional[Dict]) -> Optional[Dict[str, int]]:
+    """Maps participant tag -> decks used for the current war (None if unavailable)."""
+    if not (war_data and "clan" in war_data and "participants" in war_data["clan"]):
+        return None
+    participants = war_data["clan"]["participants"]
+    return dict(zip(
+        [p["tag"] for p in participants],
+        [p.get("decksUsed", 0) for p in participants]
+    ))
+
+def process_audit(roster: Dict[str, List[Any]], decks_by_tag: Optional[Dict[str, int]], audit_info: Dict) -> Tuple[List[Dict], Dict[str, int]]:
     """Processes audit logic: compares actual usage vs targets."""
     audit_results = []
     stats = {"on_track": 0, "warning": 0, "danger": 0, "incomplete": 0, "zero": 0}
     target = audit_info["target_decks"]
 
-    if war_data and "clan" in war_data and "participants" in war_data["clan"]:
-        participants = {p["tag"]: p for p in war_data["clan"]["participants"]}
+    if decks_by_tag is not None:
+        get_decks = decks_by_tag.get
+        tags, names, roles = roster["tag"], roster["name"], roster["role"]
         
-        for member in clan_members:
-            tag = member["tag"]
-            p_data = participants.get(tag, {})
-            decks_used = p_data.get("decksUsed", 0)
-            
-            missing = max(0, target - decks_used)
-            
-            # Determine Status
-            status_class = "success"
-            status_label = "OK"
-            
-            if decks_used == 0:
-                status_class = "danger"
-                status_label = "ZERADO"
-                stats["danger"] += 1
-                stats["zero"] += 1
-            elif missing > 0:
-                status_class = "warning"
-                status_label = "ATRASADO"
-                stats["warning"] += 1
-                stats["incomplete"] += 1
-            else:
-                stats["on_track"] += 1
-                
-            audit_results.append({
-                "name": member["name"],
-                "tag": member["tag"],
-                "role": member.get("role", "member"),
-                "decks_used": decks_used,
-                "missing": missing,
-                "status_class": status_class,
-                "status_label": status_label
-            })
-    
-    # Sort: Danger (Zeros) -> Warning (Incomplete) -> Success (OK)
-    # Secondary sort: Decks used (ascending)
-    audit_results.sort(key=lambda x: (
-        0 if x["status_class"] == "danger" else 1 if x["status_class"] == "warning" else 2, 
-        x["decks_used"]
-    ))
+        # Elementwise passes over the arrays instead of a branchy per-member loop
+        # Status id: 0 = Zero, 1 = Incomplete, 2 = On track
+        decks = [get_decks(tag, 0) for tag in tags]
+        sids = [0 if d == 0 else (1 if d < target else 2) for d in decks]
+        
+        counts = (sids.count(0), sids.count(1), sids.count(2))
+        stats["danger"] = stats["zero"] = counts[0]
+        stats["warning"] = stats["incomplete"] = counts[1]
+        stats["on_track"] = counts[2]
+        
+        # Sort: Danger (Zeros) -> Warning (Incomplete) -> Success (OK)
+        # Bucket by status id, then sort each bucket by decks used (ascending)
+        buckets = ([], [], [])
+        for i, sid in enumerate(sids):
+            buckets[sid].append(i)
+        by_decks = decks.__getitem__
+        order = []
+        for bucket in buckets:
+            bucket.sort(key=by_decks)
+            order += bucket
+        
+        audit_results = [
+            {
+                "name": names[i],
+                "tag": tags[i],
+                "role": roles[i] or "member",
+                "decks_used": decks[i],
+                "missing": max(0, target - decks[i]),
+                "status_class": _STATUS_CLASS[sids[i]],
+                "status_label": _STATUS_LABEL[sids[i]]
+            }
+            for i in order
+        ]
     
     return audit_results, stats
 
@@ -162,25 +192,30 @@ def main():
     clan_trophies = clan.get("clanWarTrophies", 0)
     league_name, league_color = calculate_league(clan_trophies)
     
+    # Index members/participants once; audit and ranking share these arrays
+    roster = index_members(clan.get("memberList", []))
+    decks_by_tag = index_participants(war)
+    
     # Audit Context
     audit_info = get_war_day_context()
-    audit_results, audit_stats = process_audit(clan.get("memberList", []), war, audit_info)
+    audit_results, audit_stats = process_audit(roster, decks_by_tag, audit_info)
 
     # Ranking Calculation
-    all_players = []
+    tags, names, roles = roster["tag"], roster["name"], roster["role"]
+    trophies, donations = roster["trophies"], roster["donations"]
+    order = sorted(range(len(tags)), key=trophies.__getitem__, reverse=True)
     
-    for m in clan.get("memberList", []):
-        player = {
-            "name": m.get("name"),
-            "tag": m.get("tag"),
-            "role": m.get("role"),
-            "trophies": m.get("trophies", 0),
-            "donations": m.get("donations", 0),
-            "war_score": 0 
+    all_players = [
+        {
+            "name": names[i],
+            "tag": tags[i],
+            "role": roles[i],
+            "trophies": trophies[i],
+            "donations": donations[i],
+            "war_score": 0
         }
-        all_players.append(player)
-        
-    all_players.sort(key=lambda x: x["trophies"], reverse=True)
+        for i in order
+    ]
     top_players = all_players[:3] if len(all_players) >= 3 else all_players
 
     # Prepare Context
@@ -200,14 +235,19 @@ def main():
         "audit_results": audit_results,
         "stats": audit_stats,
         "all_players": all_players,
-        "top_players": top_players,
-        "max": max,
-        "min": min
+        "top_players": top_players
     }
 
     # 3. Render Templates
     log("Rendering View Layer...")
-    env = Environment(loader=FileSystemLoader(config.TEMPLATES_DIR))
+    # Compiled templates are cached on disk so warm runs skip parse+compile
+    os.makedirs(config.JINJA_CACHE_DIR, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(config.TEMPLATES_DIR),
+        bytecode_cache=FileSystemBytecodeCache(config.JINJA_CACHE_DIR),
+        auto_reload=False
+    )
+    env.globals.update({"max": max, "min": min})
     
     templates_to_render = [
         "index.html", 
@@ -218,14 +258,7 @@ def main():
     ]
     
     for tmpl_name in templates_to_render:
-        try:
-            template = env.get_template(tmpl_name)
-            output = template.render(context)
-            with open(tmpl_name, "w", encoding="utf-8") as f:
-                f.write(output)
-            log(f"Generated Page: {tmpl_name}")
-        except Exception as e:
-            log(f"Render Error [{tmpl_name}]: {e}", "ERROR")
+        _render_one(env, tmpl_name, context)
             
     log("=== DASHBOARD UPDATE COMPLETED SUCCESSFULLY ===", "SUCCESS")
 
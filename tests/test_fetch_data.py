@@ -0,0 +1,56 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetch_data
+
+
+def make_wars(count):
+    """Newest-first war log entries with distinct identities."""
+    return [{"seasonId": 200 - i // 4, "sectionIndex": i % 4, "createdDate": f"d{i}"} for i in range(count)]
+
+
+def fake_api(wars, failing_cursors=()):
+    """Paginated riverracelog stub; returns None (like fetch_api) for failing cursors."""
+    def fetch(endpoint, params=None):
+        start = int((params or {}).get("after", 0))
+        if start in failing_cursors:
+            return None
+        page = {"items": wars[start:start + 10]}
+        if start + 10 < len(wars):
+            page["paging"] = {"cursors": {"after": str(start + 10)}}
+        return page
+    return fetch
+
+
+def test_stops_at_saved_history_and_prepends_new_wars():
+    wars = make_wars(40)
+    saved = wars[13:]
+    fetch = fake_api(wars)
+    with mock.patch.object(fetch_data, "fetch_api", side_effect=fetch) as api:
+        result, new_count = fetch_data.fetch_deep_war_log("tag", saved_items=saved)
+    assert result == wars
+    assert new_count == 13
+    assert api.call_count == 2
+
+
+def test_failed_page_keeps_saved_history_without_gap():
+    wars = make_wars(40)
+    saved = wars[25:]
+    with mock.patch.object(fetch_data, "fetch_api", side_effect=fake_api(wars, failing_cursors={10})):
+        result, new_count = fetch_data.fetch_deep_war_log("tag", saved_items=saved)
+    assert result == saved
+    assert new_count == 0
+
+
+def test_failed_page_without_saved_history_returns_fetched_pages():
+    wars = make_wars(40)
+    with mock.patch.object(fetch_data, "fetch_api", side_effect=fake_api(wars, failing_cursors={10})):
+        result, new_count = fetch_data.fetch_deep_war_log("tag")
+    assert result == wars[:10]
+    assert new_count == 10